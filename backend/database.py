@@ -1,19 +1,107 @@
 import sqlite3
 import json
 from typing import Optional, List, Dict, Any
-from datetime import datetime
 import os
+import time
+import atexit
+import threading
+import itertools
+import msgspec
+
+# SQL text is kept constant so sqlite3's per-connection statement cache reuses the prepared statements
+SQL_INSERT_ALERT = """
+    INSERT INTO alerts (id, timestamp, status, identity, confidence, angle, distance, snapshot_path, acknowledged, meta_mp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SQL_GET_ALERT_BY_ID = "SELECT * FROM alerts WHERE id = ?"
+SQL_ACK_ALERT = "UPDATE alerts SET acknowledged = 1 WHERE id = ?"
+SQL_DELETE_OLD_ALERTS = "DELETE FROM alerts WHERE timestamp < ?"
+SQL_ALERT_COUNTS = """
+    SELECT
+        COUNT(*),
+        SUM(CASE WHEN acknowledged = 0 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN status = 'friendly' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN status = 'unknown' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN status = 'suspicious' THEN 1 ELSE 0 END)
+    FROM alerts
+"""
+SQL_INSERT_WHITELIST = """
+    INSERT OR REPLACE INTO whitelist (name, sample_images, enc_count, created_at)
+    VALUES (?, ?, ?, ?)
+"""
+SQL_GET_WHITELIST = "SELECT * FROM whitelist ORDER BY name"
+
+# get_alerts query for each (include_meta, filter by status, filter by acknowledged) combination
+_ALERT_COLUMNS = "id, timestamp, status, identity, confidence, angle, distance, snapshot_path, acknowledged"
+_ALERT_FILTERS = {
+    (False, False): "",
+    (True, False): " WHERE status = ?",
+    (False, True): " WHERE acknowledged = ?",
+    (True, True): " WHERE status = ? AND acknowledged = ?",
+}
+SQL_GET_ALERTS = {
+    (include_meta, by_status, by_ack):
+        f"SELECT {_ALERT_COLUMNS}{', meta, meta_mp' if include_meta else ''} FROM alerts{where}"
+        " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
+    for include_meta in (False, True)
+    for (by_status, by_ack), where in _ALERT_FILTERS.items()
+}
+
+_alert_seq = itertools.count()
+
+def new_alert_id() -> str:
+    """Alert id from the current millisecond plus a per-process sequence, so ids stay unique within a millisecond"""
+    return f"alert_{time.time_ns() // 1_000_000}_{next(_alert_seq)}"
+
+# Values sqlite3 can bind; ints must fit a signed 64-bit INTEGER
+_SQLITE_TYPES = (int, float, str, bytes)
+_SQLITE_INT_MIN, _SQLITE_INT_MAX = -2**63, 2**63 - 1
+
+# Per-row failures a batch insert skips rather than letting one bad row discard the batch
+_ROW_ERRORS = (sqlite3.Error, OverflowError, ValueError)
+
+_meta_encoder = msgspec.msgpack.Encoder()
+_meta_decoder = msgspec.msgpack.Decoder()
+
+def _row_to_alert(row, include_meta: bool = True) -> Dict:
+    """Convert an alerts row to a dict, decoding meta from msgpack (or legacy JSON)"""
+    alert = dict(row)
+    meta_mp = alert.pop('meta_mp', None)
+    if not include_meta:
+        alert.pop('meta', None)
+    elif meta_mp is not None:
+        alert['meta'] = _meta_decoder.decode(meta_mp)
+    elif alert['meta']:
+        alert['meta'] = json.loads(alert['meta'])
+    return alert
 
 class Database:
     def __init__(self, db_path: str = "storage/doggobot.db"):
         self.db_path = db_path
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        
+        # One long-lived connection shared by all requests; writes are serialized
+        self._write_lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._conn.execute("PRAGMA cache_size=-64000")
+        atexit.register(self.close)
+        
         self.init_db()
     
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return self._conn
+    
+    def close(self):
+        if self._conn is None:
+            return
+        # Let SQLite re-analyze tables whose statistics drifted during this run
+        self._conn.execute("PRAGMA optimize")
+        self._conn.close()
+        self._conn = None
     
     def init_db(self):
         conn = self.get_connection()
@@ -35,6 +123,11 @@ class Database:
             )
         """)
         
+        # Migrate: meta is stored as a msgpack BLOB; the JSON column is kept for older rows
+        columns = [col['name'] for col in cursor.execute("PRAGMA table_info(alerts)")]
+        if 'meta_mp' not in columns:
+            cursor.execute("ALTER TABLE alerts ADD COLUMN meta_mp BLOB")
+        
         # Create whitelist table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS whitelist (
@@ -48,24 +141,29 @@ class Database:
         
         # Create index for faster queries
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts(timestamp DESC)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_acknowledged ON alerts(acknowledged)")
         
-        conn.commit()
-        conn.close()
-    
-    def insert_alert(self, alert_data: Dict[str, Any]) -> str:
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        # Single-column status/acknowledged indexes are prefixes of the composites below; drop them from older databases
+        cursor.execute("DROP INDEX IF EXISTS idx_alerts_status")
+        cursor.execute("DROP INDEX IF EXISTS idx_alerts_acknowledged")
         
-        alert_id = alert_data.get('id', f"alert_{int(datetime.now().timestamp() * 1000)}")
+        # Composite indexes so every filtered /alerts query walks an index in timestamp order and stops at LIMIT;
+        # the unfiltered query is served by idx_alerts_timestamp
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_status_ack_ts ON alerts(status, acknowledged, timestamp DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_status_ts ON alerts(status, timestamp DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_ack_ts ON alerts(acknowledged, timestamp DESC)")
         
-        cursor.execute("""
-            INSERT INTO alerts (id, timestamp, status, identity, confidence, angle, distance, snapshot_path, acknowledged, meta)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            alert_id,
-            alert_data.get('timestamp', datetime.now().timestamp()),
+        # Refresh planner statistics where they are missing or stale (0x10002: consider every table on open)
+        cursor.execute("PRAGMA optimize=0x10002")
+    
+    def alert_row(self, alert_data: Dict[str, Any]) -> tuple:
+        """
+        Build the alerts row for alert_data.
+        Raises TypeError, OverflowError or ValueError for values SQLite cannot store,
+        so callers can reject a bad alert before it is queued with others.
+        """
+        row = (
+            alert_data.get('id') or new_alert_id(),
+            alert_data.get('timestamp', time.time()),
             alert_data.get('status', 'unknown'),
             alert_data.get('identity'),
             alert_data.get('confidence'),
@@ -73,67 +171,117 @@ class Database:
             alert_data.get('distance'),
             alert_data.get('snapshot_path'),
             False,
-            json.dumps(alert_data.get('meta', {}))
-        ))
+            _meta_encoder.encode(alert_data.get('meta', {}))
+        )
+        
+        for value in row:
+            if value is None:
+                continue
+            if not isinstance(value, _SQLITE_TYPES):
+                raise TypeError(f"Unsupported alert value {value!r}")
+            if isinstance(value, int) and not _SQLITE_INT_MIN <= value <= _SQLITE_INT_MAX:
+                raise OverflowError(f"Alert value {value} does not fit a 64-bit integer")
+            if isinstance(value, str):
+                value.encode()  # lone surrogates cannot be stored as UTF-8
+        
+        return row
+    
+    def insert_alert(self, alert_data: Dict[str, Any]) -> str:
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        row = self.alert_row(alert_data)
+        
+        with self._write_lock:
+            cursor.execute(SQL_INSERT_ALERT, row)
+        
+        return row[0]
+    
+    def insert_alerts_batch(self, rows: List[tuple]) -> List[str]:
+        """Insert rows built by alert_row in a single transaction (one fsync per batch); returns the ids inserted"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        inserted = [row[0] for row in rows]
+        
+        with self._write_lock:
+            cursor.execute("BEGIN")
+            try:
+                cursor.executemany(SQL_INSERT_ALERT, rows)
+            except _ROW_ERRORS:
+                # A conflicting or unbindable row must not discard the rest of the batch: redo it row by row.
+                # A failed statement only aborts itself, so the transaction stays open.
+                cursor.execute("ROLLBACK")
+                cursor.execute("BEGIN")
+                inserted = []
+                for row in rows:
+                    try:
+                        cursor.execute(SQL_INSERT_ALERT, row)
+                        inserted.append(row[0])
+                    except _ROW_ERRORS as e:
+                        print(f"Skipping alert {row[0]}: {e}")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
         
-        conn.commit()
-        conn.close()
-        return alert_id
+        return inserted
     
-    def get_alerts(self, limit: int = 20, offset: int = 0, status: Optional[str] = None, acknowledged: Optional[bool] = None) -> List[Dict]:
+    def get_alerts(self, limit: int = 20, offset: int = 0, status: Optional[str] = None, acknowledged: Optional[bool] = None, include_meta: bool = True) -> List[Dict]:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        query = "SELECT * FROM alerts WHERE 1=1"
         params = []
         
         if status:
-            query += " AND status = ?"
             params.append(status)
         
         if acknowledged is not None:
-            query += " AND acknowledged = ?"
             params.append(1 if acknowledged else 0)
         
-        query += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
         params.extend([limit, offset])
+        query = SQL_GET_ALERTS[(include_meta, bool(status), acknowledged is not None)]
         
         cursor.execute(query, params)
         rows = cursor.fetchall()
-        conn.close()
         
-        alerts = []
-        for row in rows:
-            alert = dict(row)
-            if alert['meta']:
-                alert['meta'] = json.loads(alert['meta'])
-            alerts.append(alert)
-        
-        return alerts
+        return [_row_to_alert(row, include_meta) for row in rows]
     
     def get_alert_by_id(self, alert_id: str) -> Optional[Dict]:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT * FROM alerts WHERE id = ?", (alert_id,))
+        cursor.execute(SQL_GET_ALERT_BY_ID, (alert_id,))
         row = cursor.fetchone()
-        conn.close()
         
         if row:
-            alert = dict(row)
-            if alert['meta']:
-                alert['meta'] = json.loads(alert['meta'])
-            return alert
+            return _row_to_alert(row)
         return None
     
+    def get_alert_counts(self) -> Dict[str, int]:
+        """Count alerts by acknowledgement and status without loading rows"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(SQL_ALERT_COUNTS)
+        row = cursor.fetchone()
+        
+        total, unacknowledged, friendly, unknown, suspicious = (value or 0 for value in row)
+        return {
+            'total': total,
+            'unacknowledged': unacknowledged,
+            'friendly': friendly,
+            'unknown': unknown,
+            'suspicious': suspicious
+        }
+    
     def acknowledge_alert(self, alert_id: str) -> bool:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("UPDATE alerts SET acknowledged = 1 WHERE id = ?", (alert_id,))
-        conn.commit()
-        affected = cursor.rowcount
-        conn.close()
+        with self._write_lock:
+            cursor.execute(SQL_ACK_ALERT, (alert_id,))
+            affected = cursor.rowcount
         
         return affected > 0
     
@@ -141,14 +289,9 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("""
-            INSERT OR REPLACE INTO whitelist (name, sample_images, enc_count, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (name, json.dumps(sample_images), len(sample_images), datetime.now().timestamp()))
-        
-        conn.commit()
-        person_id = cursor.lastrowid
-        conn.close()
+        with self._write_lock:
+            cursor.execute(SQL_INSERT_WHITELIST, (name, json.dumps(sample_images), len(sample_images), time.time()))
+            person_id = cursor.lastrowid
         
         return person_id
     
@@ -156,9 +299,8 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT * FROM whitelist ORDER BY name")
+        cursor.execute(SQL_GET_WHITELIST)
         rows = cursor.fetchall()
-        conn.close()
         
         whitelist = []
         for row in rows:
@@ -173,9 +315,8 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("DELETE FROM alerts WHERE timestamp < ?", (before_timestamp,))
-        conn.commit()
-        deleted = cursor.rowcount
-        conn.close()
+        with self._write_lock:
+            cursor.execute(SQL_DELETE_OLD_ALERTS, (before_timestamp,))
+            deleted = cursor.rowcount
         
         return deleted
@@ -1,5 +1,5 @@
 from fastapi import FastAPI, File, UploadFile, Form, Header, HTTPException, Request
-from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List
@@ -8,10 +8,10 @@ import json
 import asyncio
 import time
 from datetime import datetime
-from io import BytesIO
-from PIL import Image
+import msgspec
+import aiofiles
 
-from database import Database
+from database import Database, new_alert_id
 from tts_engine import TTSEngine
 from nlp_handler import NLPHandler
 
@@ -49,11 +49,20 @@ tts_engine = TTSEngine(f"{STORAGE_PATH}/tts")
 nlp_handler = NLPHandler(db)
 
 # Global state for live feed
-latest_frame = None
-frame_lock = asyncio.Lock()
+# (generation, jpeg bytes) replaced as one reference on upload, so readers need no lock;
+# the generation lets streams skip frames they have already sent
+latest_frame_state = (0, None)
+frame_event = asyncio.Event()
 
 # SSE clients
-sse_clients = []
+SSE_QUEUE_SIZE = 100
+sse_clients = set()
+
+# Alert rows (built by db.alert_row) waiting to be written to the database in batches
+ALERT_BATCH_SIZE = 128
+ALERT_BATCH_WINDOW = 0.05  # seconds
+alert_queue = asyncio.Queue()
+ALERT_WRITER_STOP = object()  # queued on shutdown; the writer flushes what it holds and exits
 
 # Helper functions
 def verify_api_key(x_api_key: Optional[str] = Header(None)):
@@ -62,20 +71,80 @@ def verify_api_key(x_api_key: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid API key")
     return x_api_key
 
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking sqlite3 call in a worker thread so the event loop stays responsive"""
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+def sse_message(event: dict) -> bytes:
+    """Encode an event as a complete SSE data frame"""
+    return b"data: " + msgspec.json.encode(event) + b"\n\n"
+
 async def broadcast_sse_event(event_type: str, data: dict):
     """Broadcast event to all SSE clients"""
-    event_data = json.dumps({"type": event_type, **data})
-    disconnected = []
+    # Encoded once here; client streams yield the bytes as-is
+    payload = sse_message({"type": event_type, **data})
     
-    for queue in sse_clients:
+    for queue in tuple(sse_clients):
         try:
-            await queue.put(event_data)
-        except:
-            disconnected.append(queue)
-    
-    # Remove disconnected clients
-    for queue in disconnected:
-        sse_clients.remove(queue)
+            queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Slow consumer: drop it so it cannot stall broadcasts; its stream closes and the client reconnects
+            sse_clients.discard(queue)
+
+async def alert_writer():
+    """Drain queued alert rows and insert them in batches of up to ALERT_BATCH_SIZE"""
+    stopping = False
+    while not stopping:
+        batch = []
+        item = await alert_queue.get()
+        deadline = time.monotonic() + ALERT_BATCH_WINDOW
+        
+        while True:
+            if item is ALERT_WRITER_STOP:
+                stopping = True
+                break
+            batch.append(item)
+            
+            remaining = deadline - time.monotonic()
+            if len(batch) >= ALERT_BATCH_SIZE or remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(alert_queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+        
+        if batch:
+            try:
+                await run_db(db.insert_alerts_batch, batch)
+            except Exception as e:
+                print(f"Alert batch insert error: {e}")
+
+def flush_alert_queue():
+    """Write any alert rows still waiting in the queue"""
+    batch = []
+    while not alert_queue.empty():
+        batch.append(alert_queue.get_nowait())
+    if batch:
+        db.insert_alerts_batch(batch)
+
+@app.on_event("startup")
+async def start_alert_writer():
+    app.state.alert_writer = asyncio.create_task(alert_writer())
+
+@app.on_event("shutdown")
+async def stop_alert_writer():
+    # Everything queued before the stop marker (including the writer's partial batch) is written first
+    await alert_queue.put(ALERT_WRITER_STOP)
+    await app.state.alert_writer
+    flush_alert_queue()
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+async def save_upload(upload: UploadFile, path: str):
+    """Copy an uploaded file to disk in chunks without buffering it whole"""
+    async with aiofiles.open(path, "wb") as out:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            await out.write(chunk)
 
 # Endpoints
 
@@ -96,13 +165,11 @@ async def health_check():
 @app.get("/metrics")
 async def metrics():
     """System metrics"""
-    alerts = db.get_alerts(limit=1000)
-    total_alerts = len(alerts)
-    unacknowledged = sum(1 for a in alerts if not a['acknowledged'])
+    counts = await run_db(db.get_alert_counts)
     
     return {
-        "total_alerts": total_alerts,
-        "unacknowledged_alerts": unacknowledged,
+        "total_alerts": counts['total'],
+        "unacknowledged_alerts": counts['unacknowledged'],
         "sse_clients": len(sse_clients),
         "storage_path": STORAGE_PATH,
         "timestamp": datetime.now().isoformat()
@@ -116,15 +183,18 @@ async def upload_frame(
     """Upload a frame for live video feed"""
     verify_api_key(x_api_key)
     
-    global latest_frame
+    global latest_frame_state
     
     try:
         # Read frame data
         frame_data = await frame.read()
         
         # Store latest frame
-        async with frame_lock:
-            latest_frame = frame_data
+        latest_frame_state = (latest_frame_state[0] + 1, frame_data)
+        
+        # Wake every waiting video feed; streams that were busy catch up via the generation
+        frame_event.set()
+        frame_event.clear()
         
         return {"status": "ok", "size": len(frame_data)}
     except Exception as e:
@@ -144,29 +214,34 @@ async def create_alert(
         alert_data = json.loads(payload)
         
         # Generate alert ID
-        alert_id = f"alert_{int(datetime.now().timestamp() * 1000)}"
+        alert_id = new_alert_id()
         alert_data['id'] = alert_id
         
-        # Save snapshot if provided
         if snapshot:
             snapshot_filename = f"{alert_id}.jpg"
-            snapshot_path = os.path.join(STORAGE_PATH, "snapshots", snapshot_filename)
-            
-            with open(snapshot_path, "wb") as f:
-                f.write(await snapshot.read())
-            
             alert_data['snapshot_path'] = f"static/snapshots/{snapshot_filename}"
         
-        # Insert into database
-        db.insert_alert(alert_data)
+        # Build the database row now so a value SQLite cannot store fails this request,
+        # not the batch it would be written with
+        row = db.alert_row(alert_data)
+        
+        # Save snapshot if provided
+        if snapshot:
+            snapshot_path = os.path.join(STORAGE_PATH, "snapshots", snapshot_filename)
+            await save_upload(snapshot, snapshot_path)
         
         # Broadcast via SSE
         await broadcast_sse_event("alert", {"alert": alert_data})
         
+        # Queue for batched database insert
+        await alert_queue.put(row)
+        
         return JSONResponse({"id": alert_id}, status_code=200)
     
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    except (TypeError, ValueError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid alert: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -174,44 +249,59 @@ async def create_alert(
 async def video_feed():
     """MJPEG video feed endpoint"""
     async def generate():
+        last_seen = 0
         while True:
-            async with frame_lock:
-                if latest_frame:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + latest_frame + b'\r\n')
-            await asyncio.sleep(0.033)  # ~30 FPS
+            generation, frame = latest_frame_state
+            
+            # Sleep until a new frame arrives
+            if generation == last_seen:
+                await frame_event.wait()
+                continue
+            last_seen = generation
+            
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
     
     return StreamingResponse(
         generate(),
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
+@app.get("/frame.jpg")
+async def get_latest_frame():
+    """Latest frame as raw JPEG bytes (for polling clients)"""
+    _, frame = latest_frame_state
+    
+    if not frame:
+        raise HTTPException(status_code=404, detail="No frame available")
+    
+    return Response(content=frame, media_type="image/jpeg", headers={"Cache-Control": "no-store"})
+
 @app.get("/stream")
 async def sse_stream(request: Request):
     """Server-Sent Events stream for real-time updates"""
     async def event_generator():
-        queue = asyncio.Queue()
-        sse_clients.append(queue)
+        queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        sse_clients.add(queue)
         
         try:
             # Send initial connection message
-            yield f"data: {json.dumps({'type': 'connected', 'timestamp': time.time()})}\n\n"
+            yield sse_message({'type': 'connected', 'timestamp': time.time()})
             
             while True:
-                # Check if client disconnected
-                if await request.is_disconnected():
+                # Check if client disconnected or was dropped for falling behind
+                if await request.is_disconnected() or queue not in sse_clients:
                     break
                 
                 try:
                     # Wait for event with timeout
-                    event_data = await asyncio.wait_for(queue.get(), timeout=30.0)
-                    yield f"data: {event_data}\n\n"
+                    yield await asyncio.wait_for(queue.get(), timeout=30.0)
                 except asyncio.TimeoutError:
                     # Send heartbeat
-                    yield f"data: {json.dumps({'type': 'heartbeat', 'timestamp': time.time()})}\n\n"
+                    yield sse_message({'type': 'heartbeat', 'timestamp': time.time()})
         
         finally:
-            sse_clients.remove(queue)
+            sse_clients.discard(queue)
     
     return StreamingResponse(
         event_generator(),
@@ -234,10 +324,10 @@ async def process_nlp(request: Request):
             raise HTTPException(status_code=400, detail="Text is required")
         
         # Process command
-        response = nlp_handler.process_command(text)
+        response = await run_db(nlp_handler.process_command, text)  # status queries hit the DB
         
         # Generate TTS
-        tts_path = tts_engine.synthesize(response['text'])
+        tts_path = await asyncio.wrap_future(tts_engine.submit(response['text']))  # runs on the engine's own thread
         if tts_path:
             response['tts'] = tts_path
         
@@ -256,11 +346,12 @@ async def get_alerts(
     limit: int = 20,
     offset: int = 0,
     status: Optional[str] = None,
-    acknowledged: Optional[bool] = None
+    acknowledged: Optional[bool] = None,
+    include_meta: bool = True
 ):
     """Get alerts with filtering"""
     try:
-        alerts = db.get_alerts(limit=limit, offset=offset, status=status, acknowledged=acknowledged)
+        alerts = await run_db(db.get_alerts, limit=limit, offset=offset, status=status, acknowledged=acknowledged, include_meta=include_meta)
         return {"alerts": alerts, "count": len(alerts)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -268,7 +359,7 @@ async def get_alerts(
 @app.get("/alerts/{alert_id}")
 async def get_alert(alert_id: str):
     """Get specific alert by ID"""
-    alert = db.get_alert_by_id(alert_id)
+    alert = await run_db(db.get_alert_by_id, alert_id)
     if not alert:
         raise HTTPException(status_code=404, detail="Alert not found")
     return alert
@@ -276,7 +367,7 @@ async def get_alert(alert_id: str):
 @app.post("/alerts/{alert_id}/ack")
 async def acknowledge_alert(alert_id: str):
     """Acknowledge an alert"""
-    success = db.acknowledge_alert(alert_id)
+    success = await run_db(db.acknowledge_alert, alert_id)
     if not success:
         raise HTTPException(status_code=404, detail="Alert not found")
     
@@ -304,13 +395,12 @@ async def add_to_whitelist(
             image_filename = f"{name}_{idx}_{int(time.time())}.jpg"
             image_path = os.path.join(STORAGE_PATH, "whitelist", image_filename)
             
-            with open(image_path, "wb") as f:
-                f.write(await image.read())
+            await save_upload(image, image_path)
             
             saved_images.append(f"static/whitelist/{image_filename}")
         
         # Add to database
-        person_id = db.add_whitelist_person(name, saved_images)
+        person_id = await run_db(db.add_whitelist_person, name, saved_images)
         
         return {
             "status": "success",
@@ -326,7 +416,7 @@ async def add_to_whitelist(
 async def refresh_whitelist():
     """Refresh whitelist encodings (placeholder)"""
     try:
-        whitelist = db.get_whitelist()
+        whitelist = await run_db(db.get_whitelist)
         
         # TODO: Implement face encoding refresh
         # This would call whitelist_encode.py or similar
@@ -343,7 +433,7 @@ async def refresh_whitelist():
 async def get_whitelist():
     """Get all whitelist entries"""
     try:
-        whitelist = db.get_whitelist()
+        whitelist = await run_db(db.get_whitelist)
         return {"whitelist": whitelist, "count": len(whitelist)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
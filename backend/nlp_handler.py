@@ -2,11 +2,74 @@ import re
 from typing import Dict, Any
 from database import Database
 
+# Command keywords per intent, in priority order
+INTENT_KEYWORDS = [
+    ('status', ['status', 'report', 'what', 'how many']),
+    ('stop', ['stop', 'halt', 'pause']),
+    ('start', ['start', 'resume', 'begin', 'patrol']),
+    ('follow', ['follow']),
+    ('return_home', ['home', 'return', 'base']),
+    ('greet', ['greet', 'hello', 'hi', 'wave']),
+    ('investigate', ['investigate', 'check', 'inspect']),
+    ('alarm', ['alarm', 'alert', 'sound']),
+]
+
+INTENT_RESPONSES = {
+    'stop': {
+        'intent': 'stop',
+        'text': 'Patrol stopped. Awaiting further instructions.',
+        'action': 'stop_patrol'
+    },
+    'start': {
+        'intent': 'start',
+        'text': 'Patrol started. Monitoring for intruders.',
+        'action': 'start_patrol'
+    },
+    'follow': {
+        'intent': 'follow',
+        'text': 'Following mode activated. I will track the target.',
+        'action': 'follow'
+    },
+    'return_home': {
+        'intent': 'return_home',
+        'text': 'Returning to home position.',
+        'action': 'return_home'
+    },
+    'greet': {
+        'intent': 'greet',
+        'text': 'Hello! I am DoggoBot, your security assistant.',
+        'action': 'greet'
+    },
+    'investigate': {
+        'intent': 'investigate',
+        'text': 'Investigating the area. Stand by.',
+        'action': 'investigate'
+    },
+    'alarm': {
+        'intent': 'alarm',
+        'text': 'Alarm activated!',
+        'action': 'sound_alarm'
+    },
+}
+
+DEFAULT_RESPONSE = {
+    'intent': 'unknown',
+    'text': 'I did not understand that command. Try: status, start, stop, investigate, or return home.',
+    'action': None
+}
+
 class NLPHandler:
     """Simple rule-based NLP command handler"""
     
     def __init__(self, db: Database):
         self.db = db
+        
+        # One alternation with a named group per intent; keywords match at the start of a word
+        self._intent_priority = {intent: idx for idx, (intent, _) in enumerate(INTENT_KEYWORDS)}
+        self._intent_re = re.compile('|'.join(
+            f"(?P<{intent}>\\b(?:{'|'.join(re.escape(kw) for kw in keywords)}))"
+            for intent, keywords in INTENT_KEYWORDS
+        ))
     
     def process_command(self, text: str) -> Dict[str, Any]:
         """
@@ -14,83 +77,28 @@ class NLPHandler:
         """
         text = text.lower().strip()
         
-        # Status command
-        if any(keyword in text for keyword in ['status', 'report', 'what', 'how many']):
-            return self._handle_status()
-        
-        # Stop/pause commands
-        if any(keyword in text for keyword in ['stop', 'halt', 'pause']):
-            return {
-                'intent': 'stop',
-                'text': 'Patrol stopped. Awaiting further instructions.',
-                'action': 'stop_patrol'
-            }
-        
-        # Start/resume commands
-        if any(keyword in text for keyword in ['start', 'resume', 'begin', 'patrol']):
-            return {
-                'intent': 'start',
-                'text': 'Patrol started. Monitoring for intruders.',
-                'action': 'start_patrol'
-            }
-        
-        # Follow command
-        if 'follow' in text:
-            return {
-                'intent': 'follow',
-                'text': 'Following mode activated. I will track the target.',
-                'action': 'follow'
-            }
-        
-        # Return home command
-        if any(keyword in text for keyword in ['home', 'return', 'base']):
-            return {
-                'intent': 'return_home',
-                'text': 'Returning to home position.',
-                'action': 'return_home'
-            }
-        
-        # Greet command
-        if any(keyword in text for keyword in ['greet', 'hello', 'hi', 'wave']):
-            return {
-                'intent': 'greet',
-                'text': 'Hello! I am DoggoBot, your security assistant.',
-                'action': 'greet'
-            }
+        # Single pass over the text; the highest-priority intent found wins
+        intent = min(
+            (m.lastgroup for m in self._intent_re.finditer(text)),
+            key=self._intent_priority.__getitem__,
+            default=None
+        )
         
-        # Investigate command
-        if any(keyword in text for keyword in ['investigate', 'check', 'inspect']):
-            return {
-                'intent': 'investigate',
-                'text': 'Investigating the area. Stand by.',
-                'action': 'investigate'
-            }
-        
-        # Alarm command
-        if any(keyword in text for keyword in ['alarm', 'alert', 'sound']):
-            return {
-                'intent': 'alarm',
-                'text': 'Alarm activated!',
-                'action': 'sound_alarm'
-            }
+        if intent == 'status':
+            return self._handle_status()
         
-        # Default response
-        return {
-            'intent': 'unknown',
-            'text': 'I did not understand that command. Try: status, start, stop, investigate, or return home.',
-            'action': None
-        }
+        return dict(INTENT_RESPONSES.get(intent, DEFAULT_RESPONSE))
     
     def _handle_status(self) -> Dict[str, Any]:
         """Get current system status"""
         try:
-            alerts = self.db.get_alerts(limit=100)
-            total = len(alerts)
-            unack = sum(1 for a in alerts if not a['acknowledged'])
+            counts = self.db.get_alert_counts()
+            total = counts['total']
+            unack = counts['unacknowledged']
             
-            friendly = sum(1 for a in alerts if a['status'] == 'friendly')
-            unknown = sum(1 for a in alerts if a['status'] == 'unknown')
-            suspicious = sum(1 for a in alerts if a['status'] == 'suspicious')
+            friendly = counts['friendly']
+            unknown = counts['unknown']
+            suspicious = counts['suspicious']
             
             text = f"System status: {total} total alerts. "
             text += f"{unack} unacknowledged. "
@@ -1,41 +1,69 @@
 import pyttsx3
 import os
+import hashlib
 from datetime import datetime
-import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 class TTSEngine:
     def __init__(self, storage_path: str = "storage/tts"):
         self.storage_path = storage_path
         os.makedirs(storage_path, exist_ok=True)
-        self._lock = threading.Lock()
+        self._cache: dict[str, str] = {}  # text hash -> relative path of the synthesized file
+        
+        # Driver init is expensive, so keep one engine for the process lifetime. pyttsx3 drivers are
+        # thread-affine (SAPI5 is a COM object), so the engine is created on, and only used from,
+        # a single dedicated thread; that also serializes syntheses.
+        self._engine = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts", initializer=self._init_engine)
+        self._executor.submit(lambda: None)  # start the thread (and the engine) now rather than on first use
+    
+    def _init_engine(self):
+        try:
+            self._engine = pyttsx3.init()
+            
+            # Configure voice properties
+            self._engine.setProperty('rate', 150)  # Speed of speech
+            self._engine.setProperty('volume', 0.9)  # Volume (0.0 to 1.0)
+        except Exception as e:
+            print(f"TTS init error: {e}")
+            self._engine = None
+    
+    def submit(self, text: str) -> Future:
+        """Queue a synthesis on the engine thread; the future resolves to what synthesize() returns"""
+        return self._executor.submit(self._synthesize, text)
     
     def synthesize(self, text: str) -> str:
         """
         Synthesize text to speech and save as WAV file.
         Returns the relative path to the generated audio file.
+        Identical text reuses the previously generated file.
         """
-        with self._lock:
-            try:
-                engine = pyttsx3.init()
-                
-                # Configure voice properties
-                engine.setProperty('rate', 150)  # Speed of speech
-                engine.setProperty('volume', 0.9)  # Volume (0.0 to 1.0)
-                
-                # Generate filename
-                timestamp = int(datetime.now().timestamp() * 1000)
-                filename = f"tts_{timestamp}.wav"
-                filepath = os.path.join(self.storage_path, filename)
-                
-                # Save to file
-                engine.save_to_file(text, filepath)
-                engine.runAndWait()
-                
-                # Return relative path for API response
-                return f"static/tts/{filename}"
-            except Exception as e:
-                print(f"TTS Error: {e}")
-                return None
+        return self.submit(text).result()
+    
+    def _synthesize(self, text: str) -> str:
+        key = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+        cached = self._cache.get(key)
+        if cached:
+            return cached
+        
+        try:
+            # Filename is derived from the text so the cache survives restarts
+            filename = f"tts_{key}.wav"
+            filepath = os.path.join(self.storage_path, filename)
+            
+            # Save to file
+            if not os.path.isfile(filepath):
+                if self._engine is None:
+                    return None
+                self._engine.save_to_file(text, filepath)
+                self._engine.runAndWait()
+            
+            # Return relative path for API response
+            self._cache[key] = f"static/tts/{filename}"
+            return self._cache[key]
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            return None
     
     def cleanup_old_files(self, max_age_seconds: int = 86400):
         """Delete TTS files older than max_age_seconds (default 24 hours)"""
@@ -47,5 +75,6 @@ class TTSEngine:
                     file_age = now - os.path.getmtime(filepath)
                     if file_age > max_age_seconds:
                         os.remove(filepath)
+                        self._cache.pop(filename[len("tts_"):-len(".wav")], None)
         except Exception as e:
             print(f"TTS cleanup error: {e}")
@@ -5,6 +5,7 @@ Face Recognition Node - integrated with backend posting + FPS limiter.
 Usage:
     python face_recognition_integrated.py --source 0 --fps 30
     python face_recognition_integrated.py --source video.mp4
+    python face_recognition_integrated.py --source 0 --no-preview
 
 Notes:
  - On Windows the script will try to open cameras with DirectShow (CAP_DSHOW).
@@ -14,15 +15,31 @@ Notes:
 
 import cv2
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import time
 import argparse
 import sys
 import platform
+import queue
+import threading
 
 API_URL = "http://localhost:8000"
 API_KEY = "doggobot-secret-key-change-me"
 
+# Preview frames are downscaled to at most this width and encoded at a lower quality than snapshots
+POST_FRAME_WIDTH = 640
+POST_FRAME_JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 70]
+
+# Keep-alive session shared by the uploader threads
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+session.mount('http://', _adapter)
+session.mount('https://', _adapter)
+
+# Encoded frames waiting to be posted; kept small so a slow backend drops stale frames instead of adding latency
+UPLOAD_QUEUE_SIZE = 2
+
 def open_capture(source):
     """Open cv2.VideoCapture and try Windows DirectShow backend when appropriate."""
     try:
@@ -32,6 +49,10 @@ def open_capture(source):
                 cap = cv2.VideoCapture(source, cv2.CAP_DSHOW)
             else:
                 cap = cv2.VideoCapture(source)
+            # Ask for MJPEG (less USB bandwidth at higher FPS) and keep at most one frame
+            # queued in the driver so reads return the newest frame, not a stale backlog
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         else:
             cap = cv2.VideoCapture(source)
         return cap
@@ -39,33 +60,77 @@ def open_capture(source):
         print("Error opening capture:", e)
         return None
 
-def post_frame(api_url, api_key, frame, timeout=1.0):
+def put_latest(q, item):
+    """Put an item without blocking, discarding the oldest entry when the queue is full."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+def encode_preview(frame):
+    """Downscale and JPEG-encode a frame for /frame."""
+    height, width = frame.shape[:2]
+    if width > POST_FRAME_WIDTH:
+        scale = POST_FRAME_WIDTH / width
+        frame = cv2.resize(frame, (POST_FRAME_WIDTH, round(height * scale)), interpolation=cv2.INTER_AREA)
+    _, buffer = cv2.imencode('.jpg', frame, POST_FRAME_JPEG_PARAMS)
+    return memoryview(buffer)  # requests posts the buffer as-is, no bytes copy
+
+def post_frame(api_url, api_key, jpeg, timeout=1.0):
     try:
-        _, buffer = cv2.imencode('.jpg', frame)
-        files = {'frame': ('frame.jpg', buffer.tobytes(), 'image/jpeg')}
-        requests.post(f"{api_url}/frame", files=files, headers={"X-API-KEY": api_key}, timeout=timeout)
+        files = {'frame': ('frame.jpg', jpeg, 'image/jpeg')}
+        session.post(f"{api_url}/frame", files=files, headers={"X-API-KEY": api_key}, timeout=timeout)
         return True
     except Exception:
         return False
 
-def post_alert(api_url, api_key, frame, payload, timeout=3.0):
+def post_alert(api_url, api_key, jpeg, payload, timeout=3.0):
     try:
-        _, buffer = cv2.imencode('.jpg', frame)
-        files = {'snapshot': ('snapshot.jpg', buffer.tobytes(), 'image/jpeg')}
+        files = {'snapshot': ('snapshot.jpg', jpeg, 'image/jpeg')}
         data = {'payload': json.dumps(payload)}
-        r = requests.post(f"{api_url}/alert", data=data, files=files, headers={"X-API-KEY": api_key}, timeout=timeout)
+        r = session.post(f"{api_url}/alert", data=data, files=files, headers={"X-API-KEY": api_key}, timeout=timeout)
         return r.status_code if r is not None else None
     except Exception as e:
         # don't spam the console with requests errors every frame
         print(f"[WARN] post_alert failed: {e}")
         return None
 
+def frame_uploader(api_url, api_key, frames):
+    """Post queued preview frames (daemon thread)."""
+    while True:
+        post_frame(api_url, api_key, frames.get(), timeout=1.0)
+
+def alert_uploader(api_url, api_key, alerts):
+    """Post queued alerts in order; unlike frames, alerts are never dropped (daemon thread)."""
+    while True:
+        jpeg, payload, frame_count = alerts.get()
+        code = post_alert(api_url, api_key, jpeg, payload, timeout=3.0)
+        if code is not None:
+            print(f"📸 Alert posted (http {code}) at frame {frame_count}")
+
+def capture_reader(cap, frames, running):
+    """Read webcam frames continuously, keeping only the newest one in `frames` (thread)."""
+    while running.is_set():
+        ret, frame = cap.read()
+        if ret and frame is not None:
+            put_latest(frames, frame)
+        else:
+            # webcam dropped a frame; sleep a bit and retry
+            time.sleep(0.05)
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--source", default=0, help="webcam index or path to video file")
     parser.add_argument("--fps", type=float, default=30.0, help="target processing FPS (webcam only)")
     parser.add_argument("--post-frame-every", type=int, default=3, help="post frame to backend every N frames (0=never)")
+    parser.add_argument("--post-fps", type=float, default=0.0, help="post frames at this fixed rate instead of every N frames (0=off)")
     parser.add_argument("--alert-interval", type=float, default=5.0, help="minimum seconds between alert posts")
+    parser.add_argument("--no-preview", action="store_true", help="run headless: skip the overlay and preview window")
     args = parser.parse_args()
 
     # parse source
@@ -77,37 +142,64 @@ def main():
 
     print(f"✅ Camera/source opened: {source}")
     print(f"📡 Posting frames/alerts to: {API_URL}")
-    print("Press 'q' in the preview window to quit\n")
+    print("Press Ctrl+C to quit\n" if args.no_preview else "Press 'q' in the preview window to quit\n")
 
     frame_count = 0
     last_alert_time = 0.0
     target_fps = args.fps if args.fps and args.fps > 0 else 30.0
     min_frame_time = 1.0 / target_fps
     is_video_file = isinstance(source, str) and not str(source).isdigit()
+    post_interval = 1.0 / args.post_fps if args.post_fps > 0 else 0.0
+    next_post = time.monotonic()
+
+    # Network I/O runs on background threads so a slow backend never stalls capture
+    frame_queue = queue.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+    alert_queue = queue.Queue()
+    threading.Thread(target=frame_uploader, args=(API_URL, API_KEY, frame_queue), daemon=True).start()
+    threading.Thread(target=alert_uploader, args=(API_URL, API_KEY, alert_queue), daemon=True).start()
+
+    # Webcam frames are read on their own thread so USB frame arrival overlaps with the loop body;
+    # video files are read inline so no frames are skipped
+    running = threading.Event()
+    running.set()
+    latest_frame = queue.Queue(maxsize=1)
+    reader = None
+    if not is_video_file:
+        reader = threading.Thread(target=capture_reader, args=(cap, latest_frame, running), daemon=True)
+        reader.start()
 
     try:
+        next_tick = time.monotonic()
         while True:
-            loop_start = time.time()
-            ret, frame = cap.read()
-            if not ret or frame is None:
-                # If it's a video file, end normally; for webcam, keep trying briefly
-                if is_video_file:
+            if is_video_file:
+                ret, frame = cap.read()
+                if not ret or frame is None:
                     print("[INFO] End of video file or can't read frame.")
                     break
-                else:
-                    # webcam dropped a frame; sleep a bit and continue
-                    time.sleep(0.05)
+            else:
+                try:
+                    frame = latest_frame.get(timeout=0.5)
+                except queue.Empty:
+                    # no new webcam frame yet; keep waiting
                     continue
 
             frame_count += 1
 
-            # Post frame occasionally (reduce bandwidth)
-            if args.post_frame_every and args.post_frame_every > 0:
-                if frame_count % args.post_frame_every == 0:
-                    ok = post_frame(API_URL, API_KEY, frame, timeout=1.0)
-                    if not ok:
-                        # silent fail, but you can debug by enabling prints
-                        pass
+            # Post frame occasionally (reduce bandwidth), either on a fixed wall-clock schedule
+            # (independent of how fast frames are processed) or every N frames
+            if post_interval:
+                now_mono = time.monotonic()
+                post_due = now_mono >= next_post
+                if post_due:
+                    next_post += post_interval
+                    if next_post <= now_mono:
+                        # after a stall, restart the schedule from now rather than catching up with a burst
+                        next_post = now_mono + post_interval
+            else:
+                post_due = args.post_frame_every > 0 and frame_count % args.post_frame_every == 0
+            if post_due:
+                # encode now: the overlay below draws into this frame
+                put_latest(frame_queue, encode_preview(frame))
 
             # Post a synthetic alert every alert_interval seconds (demo / placeholder)
             now = time.time()
@@ -121,33 +213,45 @@ def main():
                     "angle": 0.0,
                     "timestamp": now
                 }
-                code = post_alert(API_URL, API_KEY, frame, payload, timeout=3.0)
-                if code is not None:
-                    print(f"📸 Alert posted (http {code}) at frame {frame_count}")
+                _, buffer = cv2.imencode('.jpg', frame)
+                alert_queue.put((memoryview(buffer), payload, frame_count))
                 last_alert_time = now
 
-            # Overlay info and show preview
-            display_text = f"Frame: {frame_count} | FPS target: {target_fps:.1f}"
-            cv2.putText(frame, display_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.imshow("DoggoBot Camera (press q to quit)", frame)
+            # Overlay info and show preview (headless runs skip the drawing entirely)
+            if not args.no_preview:
+                display_text = f"Frame: {frame_count} | FPS target: {target_fps:.1f}"
+                cv2.putText(frame, display_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv2.imshow("DoggoBot Camera (press q to quit)", frame)
 
+            # If processing a webcam, limit loop to target FPS: the rest of the frame budget is spent
+            # inside waitKey (which keeps the preview window responsive), measured against a monotonic
+            # deadline so wait overshoot does not accumulate
+            wait_ms = 1
+            if not is_video_file:
+                next_tick += min_frame_time
+                wait_ms = int((next_tick - time.monotonic()) * 1000)
+                if wait_ms < 1:
+                    # fell behind (slow frame or post); resync instead of bursting
+                    next_tick = time.monotonic()
+                    wait_ms = 1
+
+            if args.no_preview:
+                # no window to pump; a plain sleep paces the loop
+                if not is_video_file:
+                    time.sleep(wait_ms / 1000)
             # quit key
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            elif cv2.waitKey(wait_ms) & 0xFF == ord('q'):
                 break
-
-            # If processing a webcam, limit loop to target FPS
-            if not is_video_file:
-                elapsed = time.time() - loop_start
-                sleep_for = min_frame_time - elapsed
-                if sleep_for > 0:
-                    time.sleep(sleep_for)
-                # quick small safeguard to avoid drift
-                # (no exact hard real-time guarantee but it'll be close)
     except KeyboardInterrupt:
         print("\n[INFO] Interrupted by user.")
     finally:
+        running.clear()
+        if reader is not None:
+            reader.join(timeout=1.0)
         cap.release()
-        cv2.destroyAllWindows()
+        if not args.no_preview:
+            cv2.destroyAllWindows()
+        session.close()
         print(f"\n✅ Stopped. Total frames processed: {frame_count}")
 
 if __name__ == "__main__":